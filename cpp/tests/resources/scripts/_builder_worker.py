@@ -0,0 +1,53 @@
+# SPDX-FileCopyrightText: Copyright (c) 2022-2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Runs checkpoint conversion scripts and trtllm-build inside a long-lived
+# worker process, so that tensorrt_llm is imported and CUDA is initialized
+# once per worker instead of once per command.
+
+import logging as _log
+import runpy as _runpy
+import sys as _sys
+import typing as _tp
+
+
+def _get_entry_point(command: _tp.Sequence[str]) -> _tp.Callable[[], None]:
+    if command[0] == "trtllm-build":
+        from tensorrt_llm.commands.build import main
+        return main
+    if command[0] == _sys.executable and command[1].endswith(".py"):
+        return lambda: _runpy.run_path(command[1], run_name="__main__")
+    raise ValueError(f"Unsupported command: {' '.join(command)}")
+
+
+def run_command(command: _tp.Sequence[str]) -> None:
+    """Runs ``command`` in the current process, with the same arguments that
+    would be passed to build_engines_utils.run_command."""
+    _log.info("Running in worker: %s", " ".join(command))
+    entry_point = _get_entry_point(command)
+    argv = list(command[1:]) if command[0] == _sys.executable else list(command)
+    saved_argv = _sys.argv
+    _sys.argv = argv
+    try:
+        entry_point()
+    except SystemExit as e:
+        # argparse and the CLIs exit on errors; a SystemExit escaping the task
+        # would take down the worker process.
+        if e.code not in (None, 0):
+            raise RuntimeError(
+                f"Command failed with exit code {e.code}: {' '.join(command)}"
+            ) from None
+    finally:
+        _sys.argv = saved_argv
@@ -15,14 +15,22 @@
 # limitations under the License.
 
 import argparse
+import filecmp
+import functools
+import hashlib
 import os
 import platform
 import shutil
 import sys
+import threading
 import typing
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed)
+from multiprocessing import get_context
 from pathlib import Path
 from typing import Optional
 
+import _builder_worker
 from build_engines_utils import init_model_spec_module, run_command, wincopy
 
 init_model_spec_module()
@@ -34,32 +42,82 @@ import tensorrt_llm.bindings as _tb
 
 resources_dir = Path(__file__).parent.resolve().parent
 model_dir = resources_dir / "models"
+c_model_root = model_dir / "c-model"
+rt_engine_root = model_dir / "rt_engine"
 chatglm_example_dir = Path("examples/chatglm")
 bCopyModel = True  # "False" to remove redundant copy of model from model_cache
+# Shared by all builds so sibling engines reuse the measured TRT tactics.
+timing_cache = model_dir / "chatglm_timing.cache"
+model_names = ["chatglm-6b", "chatglm2-6b", "chatglm3-6b", "glm-10b"]
+# convert_checkpoint.py loads the HF model onto the GPU, so only one conversion
+# may run at a time; downloads and copies still overlap.
+_convert_lock = threading.Lock()
 
+RunCommand = typing.Callable[[typing.List[str]], None]
 
-def convert_ckpt(model_dir: str, output_dir: str, world_size: int):
-    if os.path.exists(output_dir):
-        print('Skip ckpt convert - output already exists')
+
+def _run_in_worker(worker_pool: ProcessPoolExecutor, command: typing.List[str]):
+    worker_pool.submit(_builder_worker.run_command, command).result()
+
+
+def _convert_key(model_dir: str, dtype: str, world_size: int) -> str:
+    # Identify the HF weights by name/size/mtime rather than content: hashing
+    # multi-GB shards would cost about as much as the conversion itself.
+    model_dir = Path(model_dir)
+    key = hashlib.sha256(f"{model_dir.name}|{dtype}|{world_size}".encode())
+    weight_files = sorted(model_dir.glob("*.bin")) + sorted(
+        model_dir.glob("*.safetensors"))
+    for weight_file in weight_files:
+        stat = weight_file.stat()
+        key.update(
+            f"|{weight_file.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return key.hexdigest()
+
+
+def convert_ckpt(model_dir: str,
+                 output_dir: str,
+                 world_size: int,
+                 dtype: str = "float16",
+                 run: RunCommand = run_command):
+    key = _convert_key(model_dir, dtype, world_size)
+    key_file = Path(output_dir) / ".convert_key"
+    if key_file.is_file() and key_file.read_text() == key:
+        print('Skip ckpt convert - output is up to date')
         return
 
     convert_cmd = [
         sys.executable,
-        str(chatglm_example_dir / "convert_checkpoint.py"), "--dtype=float16",
+        str(chatglm_example_dir / "convert_checkpoint.py"), f"--dtype={dtype}",
         f"--model_dir={model_dir}", f"--output_dir={output_dir}",
         f"--tp_size={world_size}"
     ]
-    run_command(convert_cmd)
+    with _convert_lock:
+        run(convert_cmd)
+    key_file.write_text(key)
 
 
-def build_engine(ckpt_dir: str,
-                 engine_dir: str,
-                 is_ifb: bool = False,
-                 is_chatglm_6b_or_glm_10b: bool = False):
-    if os.path.exists(engine_dir):
-        print('Skip engine build - output already exists')
-        return
+def _build_key(ckpt_dir: str, build_cmd: typing.List[str]) -> str:
+    # Argument order is kept: trtllm-build lets later flags override earlier
+    # ones (e.g. --context_fmha), so sorting would not be canonical.
+    key = hashlib.blake2b()
+    for arg in build_cmd:
+        if not arg.startswith("--output_dir="):
+            key.update(arg.encode() + b"\0")
+    ckpt_dir = Path(ckpt_dir)
+    ckpt_files = sorted(
+        ckpt_dir.glob("*.safetensors")) + [ckpt_dir / "config.json"]
+    for ckpt_file in ckpt_files:
+        if ckpt_file.is_file():
+            stat = ckpt_file.stat()
+            entry = f"{ckpt_file.name}:{stat.st_size}:{stat.st_mtime_ns}"
+            key.update(entry.encode() + b"\0")
+    return key.hexdigest()
 
+
+def _get_build_cmd(ckpt_dir: str,
+                   engine_dir: str,
+                   is_ifb: bool = False,
+                   is_chatglm_6b_or_glm_10b: bool = False) -> typing.List[str]:
     build_cmd = [
         "trtllm-build",
         f"--checkpoint_dir={ckpt_dir}",
@@ -71,6 +129,8 @@ def build_engine(ckpt_dir: str,
         "--max_seq_len=384",
         "--gpt_attention_plugin=float16",
         "--gemm_plugin=float16",
+        f"--input_timing_cache={timing_cache}",
+        f"--output_timing_cache={timing_cache}",
     ]
     if is_ifb:
         build_cmd.extend([
@@ -88,102 +148,195 @@ def build_engine(ckpt_dir: str,
     if is_chatglm_6b_or_glm_10b:
         print("Disable Context FMHA for ChatGLM-6B and GLM-10B")
         build_cmd.extend(["--context_fmha=disable"])
+    return build_cmd
 
-    run_command(build_cmd)
 
+def _is_up_to_date(engine_dir: str, key: str) -> bool:
+    engine_file = Path(engine_dir) / "rank0.engine"
+    key_file = Path(engine_dir) / ".build_key"
+    return engine_file.is_file() and key_file.is_file() and key_file.read_text(
+    ) == key
 
-def build_engines(model_cache: typing.Optional[str] = None,
-                  world_size: int = 1,
-                  clean: Optional[bool] = False):
 
-    for model_name in ["chatglm-6b", "chatglm2-6b", "chatglm3-6b", "glm-10b"]:
-        is_chatglm_6b_or_glm_10b = model_name in ["chatglm-6b", "glm-10b"]
-        if model_cache and (Path(model_cache) / model_name).is_dir():
-            model_cache_dir = Path(model_cache) / model_name
-            if bCopyModel or model_name == "chatglm-6b":
-                print("Copy model from model_cache")
-                hf_dir = model_dir / model_name
-                if platform.system() == "Windows":
-                    wincopy(source=str(model_cache_dir),
-                            dest=model_name,
-                            isdir=True,
-                            cwd=model_dir)
-                else:
-                    run_command(["rsync", "-rlptD",
-                                 str(model_cache_dir), "."],
-                                cwd=model_dir)
-            else:
-                print("Use model from model_cache directly except ChatGLM-6B")
-                hf_dir = Path(model_cache)
+def build_engine(ckpt_dir: str,
+                 engine_dir: str,
+                 is_ifb: bool = False,
+                 is_chatglm_6b_or_glm_10b: bool = False,
+                 run: RunCommand = run_command):
+    build_cmd = _get_build_cmd(ckpt_dir, engine_dir, is_ifb,
+                               is_chatglm_6b_or_glm_10b)
+    key = _build_key(ckpt_dir, build_cmd)
+    if _is_up_to_date(engine_dir, key):
+        print('Skip engine build - output is up to date')
+        return
+
+    run(build_cmd)
+    (Path(engine_dir) / ".build_key").write_text(key)
+
 
+def _link_or_copy(src: Path, dst_dir: Path):
+    dst = Path(dst_dir) / Path(src).name
+    if dst.is_file():
+        if os.path.samefile(src, dst) or filecmp.cmp(src, dst, shallow=False):
+            return
+        dst.unlink()
+    if platform.system() == "Windows":
+        # robocopy /mir overwrites files in place, which would write through a
+        # hard link into the source tree
+        shutil.copy2(src, dst)
+        return
+    try:
+        os.link(src, dst)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        # The filesystem refused the hard link (cross-device, unsupported,
+        # link limit), try a reflink before copying
+        if platform.system() == "Linux":
+            run_command(["cp", "--reflink=auto", str(src), str(dst)])
         else:
+            shutil.copy2(src, dst)
+
+
+def _prepare_checkpoint(model_name: str,
+                        model_cache: typing.Optional[str] = None,
+                        world_size: int = 1,
+                        clean: Optional[bool] = False,
+                        run: RunCommand = run_command) -> Path:
+    if model_cache and (Path(model_cache) / model_name).is_dir():
+        model_cache_dir = Path(model_cache) / model_name
+        if bCopyModel or model_name == "chatglm-6b":
+            print("Copy model from model_cache")
             hf_dir = model_dir / model_name
-            if not hf_dir.is_dir():
-                print("Clone model from HF")
-                run_command(
-                    [
-                        "git", "clone",
-                        f"https://huggingface.co/THUDM/{model_name}", model_name
-                    ],
-                    cwd=model_dir,
-                )
-
-        # Build engines
-        print(f"Building {model_name}")
-        ckpt_dir = Path(model_dir) / "c-model" / model_name
-        if clean:
-            print('clean up ckpt folder ', ckpt_dir)
-            if ckpt_dir.is_dir():
-                shutil.rmtree(ckpt_dir, ignore_errors=True)
-
-        # Fix HF error for ChatGLM-6B / GLM-4-9B / ChatGLM2-6B, hope to remove this in the future
-        if model_name == "chatglm-6b":
-            shutil.copy(
-                chatglm_example_dir / "chatglm-6b/tokenization_chatglm.py",
-                hf_dir,
-            )
-        if model_name == "glm-4-9b":
-            shutil.copy(
-                chatglm_example_dir / "glm-4-9b/tokenization_chatglm.py",
-                hf_dir,
+            if platform.system() == "Windows":
+                # Drop tokenizer hard links left by earlier runs before robocopy
+                # overwrites them in place
+                tokenizer_file = hf_dir / "tokenization_chatglm.py"
+                if tokenizer_file.is_file() and tokenizer_file.stat(
+                ).st_nlink > 1:
+                    tokenizer_file.unlink()
+                wincopy(source=str(model_cache_dir),
+                        dest=model_name,
+                        isdir=True,
+                        cwd=model_dir)
+            else:
+                # Local copy, so skip the delta-transfer algorithm. No
+                # --inplace: files in hf_dir may be hard links into the source
+                # tree (see _link_or_copy), which must be replaced rather than
+                # written through.
+                run_command([
+                    "rsync", "-rlptD", "--whole-file", "--no-compress",
+                    str(model_cache_dir), "."
+                ],
+                            cwd=model_dir)
+        else:
+            print("Use model from model_cache directly except ChatGLM-6B")
+            hf_dir = Path(model_cache)
+
+    else:
+        hf_dir = model_dir / model_name
+        if not hf_dir.is_dir():
+            print("Clone model from HF")
+            # Shallow clone without lfs, then fetch only the weight and
+            # tokenizer files needed by convert_checkpoint.py
+            run_command(
+                [
+                    "git", "clone", "--depth=1", "--single-branch",
+                    f"https://huggingface.co/THUDM/{model_name}", model_name
+                ],
+                cwd=model_dir,
+                env={
+                    **os.environ, "GIT_LFS_SKIP_SMUDGE": "1"
+                },
             )
-        if model_name == "chatglm2-6b":
-            shutil.copy(
-                chatglm_example_dir / "chatglm2-6b/tokenization_chatglm.py",
-                hf_dir,
+            run_command(
+                [
+                    "git", "lfs", "pull",
+                    "--include=*.bin,*.safetensors,*.model,tokenizer*"
+                ],
+                cwd=hf_dir,
             )
 
-        convert_ckpt(hf_dir, ckpt_dir, world_size)
-
-        model_spec_obj = model_spec.ModelSpec('input_tokens.npy',
-                                              _tb.DataType.HALF)
-        model_spec_obj.set_kv_cache_type(_tb.KVCacheType.CONTINUOUS)
-        model_spec_obj.use_gpt_plugin()
-        engine_dir = Path(
-            model_dir
-        ) / "rt_engine" / model_name / model_spec_obj.get_model_path(
-        ) / "tp1-pp1-cp1-gpu"
-        if clean:
-            print('clean up engine folder ', engine_dir)
-            if engine_dir.is_dir():
-                shutil.rmtree(engine_dir, ignore_errors=True)
-        build_engine(ckpt_dir, engine_dir, False, is_chatglm_6b_or_glm_10b)
-
-        model_spec_obj.use_packed_input()
-        model_spec_obj.set_kv_cache_type(_tb.KVCacheType.PAGED)
-        engine_dir = Path(
-            model_dir
-        ) / "rt_engine" / model_name / model_spec_obj.get_model_path(
-        ) / "tp1-pp1-cp1-gpu"
-        if clean:
-            print('clean up engine folder ', engine_dir)
-            if engine_dir.is_dir():
-                shutil.rmtree(engine_dir, ignore_errors=True)
-        build_engine(ckpt_dir, engine_dir, True, is_chatglm_6b_or_glm_10b)
+    print(f"Converting {model_name}")
+    ckpt_dir = c_model_root / model_name
+    if clean:
+        print('clean up ckpt folder ', ckpt_dir)
+        if ckpt_dir.is_dir():
+            shutil.rmtree(ckpt_dir, ignore_errors=True)
+
+    # Fix HF error for ChatGLM-6B / GLM-4-9B / ChatGLM2-6B, hope to remove this in the future
+    if model_name == "chatglm-6b":
+        _link_or_copy(
+            chatglm_example_dir / "chatglm-6b/tokenization_chatglm.py",
+            hf_dir,
+        )
+    if model_name == "glm-4-9b":
+        _link_or_copy(
+            chatglm_example_dir / "glm-4-9b/tokenization_chatglm.py",
+            hf_dir,
+        )
+    if model_name == "chatglm2-6b":
+        _link_or_copy(
+            chatglm_example_dir / "chatglm2-6b/tokenization_chatglm.py",
+            hf_dir,
+        )
+
+    convert_ckpt(hf_dir, ckpt_dir, world_size, run=run)
+    return ckpt_dir
+
+
+def build_engines(model_cache: typing.Optional[str] = None,
+                  world_size: int = 1,
+                  clean: Optional[bool] = False):
+
+    # Conversion and build commands run in a reused worker process, so the
+    # tensorrt_llm import and CUDA initialization are paid once. They never
+    # overlap (see _convert_lock), so one worker is enough.
+    with ProcessPoolExecutor(max_workers=1,
+                             mp_context=get_context("spawn")) as worker_pool:
+        _build_engines(model_cache, world_size, clean,
+                       functools.partial(_run_in_worker, worker_pool))
 
     print("Done")
 
 
+def _build_engines(model_cache: typing.Optional[str] = None,
+                   world_size: int = 1,
+                   clean: Optional[bool] = False,
+                   run: RunCommand = run_command):
+    # Download/copy is independent per model, so run it concurrently; the
+    # conversions themselves are serialized by _convert_lock.
+    with ThreadPoolExecutor(max_workers=len(model_names)) as executor:
+        futures = {}
+        for model_name in model_names:
+            future = executor.submit(_prepare_checkpoint, model_name,
+                                     model_cache, world_size, clean, run)
+            futures[future] = model_name
+        ckpt_dirs = {
+            futures[future]: future.result()
+            for future in as_completed(futures)
+        }
+
+    model_spec_obj = model_spec.ModelSpec('input_tokens.npy', _tb.DataType.HALF)
+    model_spec_obj.set_kv_cache_type(_tb.KVCacheType.CONTINUOUS)
+    model_spec_obj.use_gpt_plugin()
+    for is_ifb in [False, True]:
+        if is_ifb:
+            model_spec_obj.use_packed_input()
+            model_spec_obj.set_kv_cache_type(_tb.KVCacheType.PAGED)
+        engine_subdir = Path(model_spec_obj.get_model_path(), "tp1-pp1-cp1-gpu")
+        for model_name in model_names:
+            is_chatglm_6b_or_glm_10b = model_name in ["chatglm-6b", "glm-10b"]
+            engine_dir = rt_engine_root / model_name / engine_subdir
+            if clean:
+                print('clean up engine folder ', engine_dir)
+                if engine_dir.is_dir():
+                    shutil.rmtree(engine_dir, ignore_errors=True)
+            print(f"Building {model_name}")
+            build_engine(ckpt_dirs[model_name], engine_dir, is_ifb,
+                         is_chatglm_6b_or_glm_10b, run)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--model_cache",
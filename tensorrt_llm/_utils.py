@@ -22,7 +22,7 @@ import weakref
 from contextlib import contextmanager
 from dataclasses import asdict
 from enum import EnumMeta
-from functools import partial
+from functools import lru_cache, partial
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Sequence, Union
 
@@ -565,6 +565,8 @@ def release_gc():
         torch.cuda.ipc_collect()
 
 
+# Device 0 does not change within a process, so query its properties once.
+@lru_cache(maxsize=1)
 def get_sm_version():
     prop = torch.cuda.get_device_properties(0)
     return prop.major * 10 + prop.minor
@@ -12,7 +12,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from dataclasses import asdict, dataclass
+from dataclasses import dataclass, fields
 from enum import IntEnum
 from typing import List, Optional, Type, Union
 
@@ -54,7 +54,7 @@ activation_str_to_int_map = {
 }
 
 
-@dataclass
+@dataclass(slots=True)
 class MoeConfig:
 
     class ExpertScaleNormalizationMode(IntEnum):
@@ -91,7 +91,9 @@ class MoeConfig:
         return cls(**config)
 
     def to_dict(self):
-        return asdict(self)
+        # All fields are scalars, so build the dict directly rather than going
+        # through the recursive deepcopy of dataclasses.asdict.
+        return {f.name: getattr(self, f.name) for f in fields(self)}
 
 
 def _moe_plugin(moe_config,
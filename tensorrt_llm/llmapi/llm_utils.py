@@ -41,7 +41,8 @@ import torch
 from tqdm import tqdm
 from transformers import PreTrainedTokenizerBase
 
-from .._utils import mpi_barrier, mpi_broadcast, mpi_rank, release_gc
+from .._utils import (get_sm_version, mpi_barrier, mpi_broadcast, mpi_rank,
+                      release_gc)
 from ..auto_parallel import AutoParallelConfig, infer_cluster_config
 from ..bindings.executor import (BatchingType, CapacitySchedulerPolicy,
                                  ContextChunkingPolicy, DecodingConfig,
@@ -505,7 +506,7 @@ class LlmArgs:
                 trust_remote_code=self.trust_remote_code,
                 use_fast=self.tokenizer_mode != 'slow')
 
-        if torch.cuda.get_device_properties(0).major < 8:
+        if get_sm_version() < 80:
             if self.dtype == 'auto':
                 self.dtype = 'float16'
             if self.dtype == 'bfloat16':
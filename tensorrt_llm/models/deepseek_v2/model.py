@@ -19,7 +19,7 @@ from typing import Optional
 import torch
 import transformers
 
-from ..._utils import pad_vocab_size, torch_dtype_to_str
+from ..._utils import get_sm_version, pad_vocab_size, torch_dtype_to_str
 from ...functional import Tensor, non_gated_version, recv, send
 from ...layers import (MOE, AttentionMaskType, ColumnLinear,
                        DeepseekV2Attention, Embedding, GatedMLP, MoeConfig,
@@ -261,8 +261,7 @@ class DeepseekV2ForCausalLM(DecoderModelForCausalLM):
             dtype = torch_dtype_to_str(dtype)
         if dtype == 'float32':  # should remove "float32"
             dtype = 'float16'
-        if dtype == 'bfloat16' and torch.cuda.get_device_properties(
-                0).major < 8:
+        if dtype == 'bfloat16' and get_sm_version() < 80:
             logger.warning(
                 "Pre SM 80 GPUs do not support bfloat16, fallback to float16")
             dtype = 'float16'
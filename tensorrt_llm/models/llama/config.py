@@ -12,8 +12,10 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import functools
 import json
 import math
+import os
 import sys
 from pathlib import Path
 from typing import Optional, Union
@@ -23,6 +25,42 @@ from ...mapping import Mapping
 from ..convert_utils import infer_dtype
 from ..modeling_utils import PretrainedConfig, QuantConfig
 
+try:
+    # orjson is optional; json.loads accepts the same bytes input
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
+# HF MoE model types that use gated activation implicitly
+_GATED_MOE_MODEL_TYPES = frozenset({"mixtral", "arctic", "granitemoe"})
+
+_LEGACY_MOE_FIELDS = ("moe_num_experts", "moe_top_k", "moe_normalization_mode")
+
+_registered_vila_paths = set()
+
+
+@functools.lru_cache(maxsize=32)
+def _load_hf_config(hf_config_dir: str, trust_remote_code: bool):
+    # The returned config is shared between calls; callers must not modify it.
+    import transformers
+
+    if "vila" in hf_config_dir.lower():
+        vila_path = hf_config_dir + "/../VILA"
+        if vila_path not in _registered_vila_paths:
+            sys.path.append(vila_path)
+            from llava.model import LlavaLlamaConfig  # noqa
+            from llava.model import LlavaLlamaModel
+            transformers.AutoConfig.register("llava_llama",
+                                             LlavaLlamaConfig,
+                                             exist_ok=True)
+            transformers.AutoModelForCausalLM.register(LlavaLlamaConfig,
+                                                       LlavaLlamaModel,
+                                                       exist_ok=True)
+            _registered_vila_paths.add(vila_path)
+
+    return transformers.AutoConfig.from_pretrained(
+        hf_config_dir, trust_remote_code=trust_remote_code)
+
 
 class LLaMAConfig(PretrainedConfig):
 
@@ -50,13 +88,16 @@ class LLaMAConfig(PretrainedConfig):
         if moe is None:
             # Legacy MOE config fields
             moe = MoeConfig(
-                num_experts=kwargs.pop('moe_num_experts', 0),
-                top_k=kwargs.pop('moe_top_k', 0),
-                normalization_mode=kwargs.pop(
+                num_experts=kwargs.get('moe_num_experts', 0),
+                top_k=kwargs.get('moe_top_k', 0),
+                normalization_mode=kwargs.get(
                     'moe_normalization_mode',
                     MoeConfig.ExpertScaleNormalizationMode.RENORMALIZE))
         elif isinstance(moe, dict):
             moe = MoeConfig.from_dict(moe)
+        # Legacy MOE fields are superseded by moe, don't set them as attributes
+        for key in _LEGACY_MOE_FIELDS:
+            kwargs.pop(key, None)
         assert isinstance(moe, MoeConfig)
         self.moe = moe.validate()
         self.remove_duplicated_kv_heads = remove_duplicated_kv_heads
@@ -98,26 +139,16 @@ class LLaMAConfig(PretrainedConfig):
             mapping: Optional[Mapping] = None,
             quant_config: Optional[QuantConfig] = None,
             **kwargs):
-        import transformers
-
         trust_remote_code = kwargs.pop('trust_remote_code', True)
         has_partial_lora_mask = False
 
-        if isinstance(hf_config_or_dir, transformers.PretrainedConfig):
+        # Only a config directory requires transformers to be imported, which
+        # _load_hf_config does on its first call.
+        if not isinstance(hf_config_or_dir, (str, os.PathLike)):
             hf_config = hf_config_or_dir
         else:
             hf_config_dir = str(hf_config_or_dir)
-            if "vila" in hf_config_dir.lower():
-                sys.path.append(hf_config_dir + "/../VILA")
-                from llava.model import LlavaLlamaConfig  # noqa
-                from llava.model import LlavaLlamaModel
-                transformers.AutoConfig.register("llava_llama",
-                                                 LlavaLlamaConfig)
-                transformers.AutoModelForCausalLM.register(
-                    LlavaLlamaConfig, LlavaLlamaModel)
-
-            hf_config = transformers.AutoConfig.from_pretrained(
-                hf_config_dir, trust_remote_code=trust_remote_code)
+            hf_config = _load_hf_config(hf_config_dir, trust_remote_code)
             if hf_config.model_type == "llava":
                 # LLaVA = Vision model + Llama LLM
                 # We load a llava config and use its' text config as llama config
@@ -129,61 +160,68 @@ class LLaMAConfig(PretrainedConfig):
                 hf_config = LlavaNextConfig.from_pretrained(
                     hf_config_dir).text_config
             if hf_config.model_type == "llava_llama":
-                hf_config.llm_cfg["architecture"] = hf_config.llm_cfg[
-                    "architectures"][0]
-                hf_config.llm_cfg["dtype"] = hf_config.llm_cfg["torch_dtype"]
-                hf_config = PretrainedConfig.from_dict(hf_config.llm_cfg)
+                # Copy, as hf_config is the cached object of _load_hf_config
+                llm_cfg = dict(hf_config.llm_cfg)
+                llm_cfg["architecture"] = llm_cfg["architectures"][0]
+                llm_cfg["dtype"] = llm_cfg["torch_dtype"]
+                hf_config = PretrainedConfig.from_dict(llm_cfg)
             if hf_config.model_type == 'internlmxcomposer2':
                 # InternLM-XComposer2 has a mask for partial lora
                 # Therefore we need an additional flag for this mask
                 has_partial_lora_mask = True
 
-        num_key_value_heads = getattr(hf_config, "num_key_value_heads",
-                                      hf_config.num_attention_heads)
-        if hf_config.model_type == "exaone":
+        # Snapshot the plain attributes (plus HF attribute_map aliases) once
+        # rather than probing hf_config with getattr for every optional field.
+        hf_attrs = dict(vars(hf_config))
+        for alias, name in getattr(hf_config, "attribute_map", {}).items():
+            if name in hf_attrs:
+                hf_attrs.setdefault(alias, hf_attrs[name])
+
+        model_type = hf_config.model_type
+        num_key_value_heads = hf_attrs.get("num_key_value_heads",
+                                           hf_config.num_attention_heads)
+        if model_type == "exaone":
             hidden_act = hf_config.activation_function
             # NOTE
             # EXAONE also uses RMS norm but they represent as layer_norm_epsilon.
-            norm_epsilon = getattr(hf_config, "layer_norm_epsilon", 1e-5)
+            norm_epsilon = hf_attrs.get("layer_norm_epsilon", 1e-5)
         else:
             hidden_act = hf_config.hidden_act
             norm_epsilon = hf_config.rms_norm_eps
-        head_dim = getattr(
-            hf_config, "head_dim",
-            hf_config.hidden_size // hf_config.num_attention_heads)
-        head_size = getattr(hf_config, "kv_channels", head_dim)
-        attn_bias = getattr(hf_config, 'bias', False) or getattr(
-            hf_config, 'attention_bias', False)
-        rotary_scaling = getattr(hf_config, "rope_scaling", None)
-        rotary_base = getattr(hf_config, "rope_theta", 10000.0)
-        residual_mlp = getattr(hf_config, "parallel_attn_mlp_res", False)
+        head_dim = hf_attrs.get(
+            "head_dim", hf_config.hidden_size // hf_config.num_attention_heads)
+        head_size = hf_attrs.get("kv_channels", head_dim)
+        attn_bias = hf_attrs.get('bias', False) or hf_attrs.get(
+            'attention_bias', False)
+        rotary_scaling = hf_attrs.get("rope_scaling", None)
+        rotary_base = hf_attrs.get("rope_theta", 10000.0)
+        residual_mlp = hf_attrs.get("parallel_attn_mlp_res", False)
         disable_weight_only_quant_plugin = kwargs.pop(
             'disable_weight_only_quant_plugin', False)
         remove_duplicated_kv_heads = kwargs.pop('remove_duplicated_kv_heads',
                                                 False)
-        embedding_multiplier = getattr(hf_config, "embedding_multiplier", 1.0)
-        attention_multiplier = getattr(hf_config, "attention_multiplier", 1.0)
+        embedding_multiplier = hf_attrs.get("embedding_multiplier", 1.0)
+        attention_multiplier = hf_attrs.get("attention_multiplier", 1.0)
         if attention_multiplier != 1.0:
             attention_multiplier *= math.sqrt(head_size)
-        residual_multiplier = getattr(hf_config, "residual_multiplier", 1.0)
-        output_multiplier_scale = 1.0 / getattr(hf_config, "logits_scaling",
-                                                1.0)
-        if hf_config.model_type in ["mixtral", "arctic", "granitemoe"]:
+        residual_multiplier = hf_attrs.get("residual_multiplier", 1.0)
+        output_multiplier_scale = 1.0 / hf_attrs.get("logits_scaling", 1.0)
+        if model_type in _GATED_MOE_MODEL_TYPES:
             # HF LLaMA-type models are implicitly using gated activation.
             # With our MoE implementation, we must make it explicit
             hidden_act = "swiglu"
             moe_normalization_mode = MoeConfig.ExpertScaleNormalizationMode.RENORMALIZE
         else:
             moe_normalization_mode = None
-        moe_num_experts = getattr(hf_config, "num_local_experts", 0)
-        moe_top_k = getattr(hf_config, "num_experts_per_tok", 0)
+        moe_num_experts = hf_attrs.get("num_local_experts", 0)
+        moe_top_k = hf_attrs.get("num_experts_per_tok", 0)
         moe_config = MoeConfig(num_experts=moe_num_experts,
                                top_k=moe_top_k,
                                normalization_mode=moe_normalization_mode)
         moe_config.validate()
 
-        dtype = infer_dtype(dtype, getattr(hf_config, 'torch_dtype', None))
-        tie_word_embeddings = getattr(hf_config, 'tie_word_embeddings', False)
+        dtype = infer_dtype(dtype, hf_attrs.get('torch_dtype', None))
+        tie_word_embeddings = hf_attrs.get('tie_word_embeddings', False)
 
         return cls(
             architecture=hf_config.architectures[0],
@@ -224,8 +262,8 @@ class LLaMAConfig(PretrainedConfig):
                        quant_config: Optional[QuantConfig] = None,
                        **kwargs):
 
-        with open(Path(meta_ckpt_dir, "params.json")) as fp:
-            meta_config: dict = json.load(fp)
+        meta_config: dict = _json_loads(
+            Path(meta_ckpt_dir, "params.json").read_bytes())
 
         n_embd = meta_config["dim"]
         n_head = meta_config["n_heads"]
@@ -240,11 +278,12 @@ class LLaMAConfig(PretrainedConfig):
             inter_size = meta_config["hidden_dim"]
         else:
             multiple_of = meta_config.get("multiple_of", 1)
-            n_embd_ = int(4 * n_embd * 2 / 3)
+            # Integer arithmetic avoids float rounding of 4 * n_embd * 2 / 3
+            n_embd_ = 8 * n_embd // 3
             ffn_dim_multiplier = meta_config.get("ffn_dim_multiplier", 1)
-            inter_size = multiple_of * (
-                (int(n_embd_ * ffn_dim_multiplier) + multiple_of - 1) //
-                multiple_of)
+            # Round up to a multiple of multiple_of
+            inter_size = multiple_of * -(-int(n_embd_ * ffn_dim_multiplier) //
+                                         multiple_of)
 
         dtype = infer_dtype(dtype, 'bfloat16')
 
@@ -23,13 +23,14 @@ from pathlib import Path
 import numpy as np
 import pytest
 import torch
+from filelock import FileLock
 from parameterized import parameterized
 from transformers import MistralConfig, MistralForCausalLM
 from transformers.cache_utils import DynamicCache
 
 import tensorrt_llm
 from tensorrt_llm import Builder
-from tensorrt_llm._utils import str_dtype_to_trt, trt_dtype_to_str
+from tensorrt_llm._utils import trt_dtype_to_str
 from tensorrt_llm.models import PretrainedConfig
 from tensorrt_llm.models.llama.convert import (load_weights_from_hf_model,
                                                load_weights_from_meta_ckpt)
@@ -44,17 +45,17 @@ from utils.util import unittest_name_func
 class TestMistralAndArctic(unittest.TestCase):
     EOS_TOKEN = 2
     PAD_TOKEN = 2
+    # TRT timing cache shared across builds and pytest runs
+    TIMING_CACHE = os.path.join(tempfile.gettempdir(),
+                                'trtllm_test_mistral_timing.cache')
 
     def _gen_tensorrt_llm_network(self, network, hf_mistral,
                                   mistral_config: MistralConfig, batch_size,
                                   beam_width, input_len, output_len, dtype,
                                   rank, tensor_parallel):
         is_arctic = hf_mistral is None
-        list(range(tensor_parallel))
 
         with net_guard(network):
-            str_dtype_to_trt(dtype)
-
             config = {
                 'architecture': "LlamaForCausalLM",
                 'dtype': dtype,
@@ -139,16 +140,18 @@ class TestMistralAndArctic(unittest.TestCase):
                                  enable_remove_input_padding=False):
 
         builder = Builder()
+        timing_cache_lock = FileLock(f'{self.TIMING_CACHE}.lock')
 
         with tempfile.TemporaryDirectory() as tmpdirname:
-            builder_config = builder.create_builder_config(
-                name=model_name,
-                precision=dtype,
-                timing_cache='model.cache',
-                tensor_parallel=world_size,  # TP only
-                use_refit=use_refit,
-                strongly_typed=True,
-            )
+            with timing_cache_lock:
+                builder_config = builder.create_builder_config(
+                    name=model_name,
+                    precision=dtype,
+                    timing_cache=self.TIMING_CACHE,
+                    tensor_parallel=world_size,  # TP only
+                    use_refit=use_refit,
+                    strongly_typed=True,
+                )
             network = builder.create_network()
             network.plugin_config.to_legacy_setting()
             if use_plugin:
@@ -164,6 +167,8 @@ class TestMistralAndArctic(unittest.TestCase):
                                            output_len, dtype, rank, world_size)
 
             engine_buffer = builder.build_engine(network, builder_config)
+            with timing_cache_lock:
+                builder.save_timing_cache(builder_config, self.TIMING_CACHE)
             return engine_buffer
 
     def _gen_tensorrt_llm_runtime(self,
@@ -202,14 +207,14 @@ class TestMistralAndArctic(unittest.TestCase):
                        dtype,
                        num_kv_heads,
                        residual_mlp,
-                       is_arctic=False):
+                       is_arctic=False,
+                       input_len=4):
         PRECHECKED_GOOD_RANDOM_SEEDS = [1, 4, 5, 8]
         model = 'llama'
         log_level = 'error'
         use_plugin = True  # gpt plugin
         batch_size = 4
         beam_width = 1
-        input_len = 4
         output_len = 2
         max_seq_len = input_len + output_len
         world_size = 1
@@ -218,7 +223,7 @@ class TestMistralAndArctic(unittest.TestCase):
         mistral_config = MistralConfig()
         mistral_config.hidden_act = 'silu'
         mistral_config.num_hidden_layers = 2
-        mistral_config.max_position_embeddings = 64
+        mistral_config.max_position_embeddings = max(64, max_seq_len)
         mistral_config.vocab_size = 128
         mistral_config.num_attention_heads = num_kv_heads if is_arctic else 2 * num_kv_heads
         mistral_config.head_dim = head_size
@@ -243,30 +248,31 @@ class TestMistralAndArctic(unittest.TestCase):
             model, use_plugin, batch_size, beam_width, input_len, output_len,
             use_refit, fast_building, context_fmha_flag,
             enable_remove_input_padding)
-        key_value_cache_buffers = []
-        head_size = mistral_config.hidden_size // mistral_config.num_attention_heads
-        for i in range(mistral_config.num_hidden_layers):
-            key_value_cache_buffers.append(
-                torch.zeros((
-                    batch_size,
-                    2,
-                    mistral_config.num_key_value_heads,
-                    max_seq_len,
-                    head_size,
-                ),
-                            dtype=tensorrt_llm._utils.str_dtype_to_torch(dtype),
-                            device='cuda'))
+        # One allocation for all layers; key_value_cache_buffers[i] is a
+        # contiguous view of layer i.
+        key_value_cache_buffers = torch.zeros(
+            (
+                mistral_config.num_hidden_layers,
+                batch_size,
+                2,
+                mistral_config.num_key_value_heads,
+                max_seq_len,
+                head_size,
+            ),
+            dtype=tensorrt_llm._utils.str_dtype_to_torch(dtype),
+            device='cuda')
 
         # compare context
         step = 0
-        ctx_ids = torch.randint(100, (batch_size, input_len)).int().cuda()
+        ctx_ids = torch.randint(100, (batch_size, input_len),
+                                dtype=torch.int32).cuda()
         ctx_context_lengths = input_len * torch.ones(
             (batch_size), dtype=torch.int32, device='cuda')
-        ctx_position_ids = torch.tensor(range(input_len),
-                                        dtype=torch.int32).reshape([
-                                            1, input_len
-                                        ]).expand([batch_size,
-                                                   input_len]).cuda()
+        ctx_position_ids = torch.arange(input_len,
+                                        dtype=torch.int32,
+                                        device='cuda').expand(
+                                            [batch_size,
+                                             input_len]).contiguous()
         ctx_last_token_ids = ctx_context_lengths.clone()
         ctx_host_request_types = torch.tensor([0] * batch_size,
                                               dtype=torch.int32)
@@ -311,6 +317,11 @@ class TestMistralAndArctic(unittest.TestCase):
         context_runtime_perf_knobs = torch.tensor([-1] * perf_knob_tensor_size,
                                                   dtype=torch.int64)
         host_context_progress = torch.tensor([0], dtype=torch.int64)
+        host_max_attention_window_sizes = torch.full(
+            (mistral_config.num_hidden_layers, ),
+            max_seq_len,
+            dtype=torch.int32)
+        host_sink_token_length = torch.zeros(1, dtype=torch.int32)
 
         ctx_buffer = {
             'input_ids': ctx_ids,
@@ -329,22 +340,33 @@ class TestMistralAndArctic(unittest.TestCase):
 
         kv_shape = (batch_size, 2, mistral_config.num_key_value_heads,
                     max_seq_len, head_size)
-        ctx_buffer[f'host_max_attention_window_sizes'] = torch.tensor(
-            [max_seq_len] * mistral_config.num_hidden_layers, dtype=torch.int32)
+        # Per-layer KV bindings, shared by the context and generation steps
+        past_key_value_names = [
+            f'past_key_value_{i}'
+            for i in range(mistral_config.num_hidden_layers)
+        ]
+        present_key_value_names = [
+            f'present_key_value_{i}'
+            for i in range(mistral_config.num_hidden_layers)
+        ]
+        kv_shapes = dict.fromkeys(past_key_value_names, kv_shape)
+        kv_buffers = {
+            **dict(zip(past_key_value_names, key_value_cache_buffers)),
+            **dict(zip(present_key_value_names, key_value_cache_buffers)),
+        }
+        ctx_buffer[
+            f'host_max_attention_window_sizes'] = host_max_attention_window_sizes
         ctx_shape[f'host_max_attention_window_sizes'] = (
             mistral_config.num_hidden_layers, )
-        for i in range(mistral_config.num_hidden_layers):
-            ctx_shape[f'past_key_value_{i}'] = kv_shape
-            ctx_buffer[f'past_key_value_{i}'] = key_value_cache_buffers[i]
-            ctx_buffer[f'present_key_value_{i}'] = key_value_cache_buffers[i]
+        ctx_shape.update(kv_shapes)
+        ctx_buffer.update(kv_buffers)
         ctx_buffer['sequence_length'] = sequence_length_buffer
         ctx_shape['sequence_length'] = ctx_buffer['sequence_length'].shape
         ctx_shape['host_past_key_value_lengths'] = (batch_size, )
         ctx_buffer['host_past_key_value_lengths'] = torch.tensor(
             [0] * batch_size, dtype=torch.int32)
         ctx_shape['host_sink_token_length'] = (1, )
-        ctx_buffer['host_sink_token_length'] = torch.tensor([0],
-                                                            dtype=torch.int32)
+        ctx_buffer['host_sink_token_length'] = host_sink_token_length
 
         context = runtime.ctx_context
         runtime._set_shape(context, ctx_shape)
@@ -360,12 +382,18 @@ class TestMistralAndArctic(unittest.TestCase):
 
         # compare generation
         step = 1
-        step1_id = torch.randint(100, (batch_size, 1)).int().cuda()
+        step1_id = torch.randint(100, (batch_size, 1), dtype=torch.int32).cuda()
         gen_context_lengths = ctx_context_lengths.clone()
         gen_position_ids = torch.ones_like(step1_id).int().cuda() * input_len
         gen_last_token_ids = torch.zeros_like(gen_context_lengths).int().cuda()
-        gen_host_request_types = torch.tensor([1] * batch_size,
-                                              dtype=torch.int32)
+        # The small step 1 host inputs are rows of one host allocation, kept
+        # alive by step1_buffer until the run below completes.
+        (gen_host_request_types, gen_host_context_lengths,
+         gen_host_past_key_value_lengths) = torch.empty((3, batch_size),
+                                                        dtype=torch.int32)
+        gen_host_request_types.fill_(1)
+        gen_host_context_lengths.copy_(gen_context_lengths)
+        gen_host_past_key_value_lengths.copy_(sequence_length_buffer)
 
         if hf_mistral:
             with torch.no_grad():
@@ -397,28 +425,24 @@ class TestMistralAndArctic(unittest.TestCase):
             'host_context_progress': host_context_progress,
         }
         if enable_remove_input_padding:
-            step1_buffer['host_context_lengths'] = gen_context_lengths.cpu()
+            step1_buffer['host_context_lengths'] = gen_host_context_lengths
 
         step1_shape = {k: v.shape for k, v in step1_buffer.items()}
 
         step1_shape[f'host_max_attention_window_sizes'] = (
             mistral_config.num_hidden_layers, )
-        step1_buffer[f'host_max_attention_window_sizes'] = torch.tensor(
-            [max_seq_len] * mistral_config.num_hidden_layers, dtype=torch.int32)
-        for i in range(mistral_config.num_hidden_layers):
-            step1_shape[f'past_key_value_{i}'] = kv_shape
+        step1_buffer[
+            f'host_max_attention_window_sizes'] = host_max_attention_window_sizes
+        step1_shape.update(kv_shapes)
         step1_shape['sequence_length'] = (batch_size, )
         step1_shape['host_past_key_value_lengths'] = (batch_size, )
         step1_shape['host_sink_token_length'] = (1, )
-        for i in range(mistral_config.num_hidden_layers):
-            step1_buffer[f'past_key_value_{i}'] = key_value_cache_buffers[i]
-            step1_buffer[f'present_key_value_{i}'] = key_value_cache_buffers[i]
+        step1_buffer.update(kv_buffers)
         step1_buffer[
-            'host_past_key_value_lengths'] = sequence_length_buffer.cpu()
-        sequence_length_buffer = torch.add(sequence_length_buffer, step)
+            'host_past_key_value_lengths'] = gen_host_past_key_value_lengths
+        sequence_length_buffer.add_(step)
         step1_buffer['sequence_length'] = sequence_length_buffer
-        step1_buffer['host_sink_token_length'] = torch.tensor([0],
-                                                              dtype=torch.int32)
+        step1_buffer['host_sink_token_length'] = host_sink_token_length
 
         context = runtime.context_1
         runtime._set_shape(context, step1_shape)
@@ -444,9 +468,15 @@ class TestMistralAndArctic(unittest.TestCase):
         self._test_moe_base(*args)
 
     def load_test_cases_arctic():
-        test_cases = []
-        test_cases.append((False, True, ContextFMHAType.disabled, False,
-                           'bfloat16', 56, True))  # arctic MHA
+        # arctic MHA with packed inputs; long inputs select the fused context
+        # FMHA kernels. The unfused path materializes [B, H, S, S] scores, so
+        # it stops at 512.
+        test_cases = [
+            case for case in product([False], [True], [
+                ContextFMHAType.disabled, ContextFMHAType.enabled
+            ], [True], ['bfloat16'], [56], [True], [4, 512, 2048])
+            if case[2] == ContextFMHAType.enabled or case[-1] <= 512
+        ]
         return test_cases
 
     @parameterized.expand(load_test_cases_arctic, name_func=unittest_name_func)
@@ -454,7 +484,8 @@ class TestMistralAndArctic(unittest.TestCase):
         # Simplified from Mistral test
         # - Arctic is not officially supported in HuggingFace yet, so skipping results comparison
         # - Skip model loader tests
-        self._test_moe_base(*args, is_arctic=True)
+        *args, input_len = args
+        self._test_moe_base(*args, is_arctic=True, input_len=input_len)
 
     def get_loader_test_cases():
         test_cases = []